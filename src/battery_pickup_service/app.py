@@ -1,9 +1,10 @@
 from logging import getLogger, DEBUG
 import requests
 from io import BytesIO
-from flask import Flask, request, send_file
-from .package_data import PackagingSystem, LocationInformation, DateInformation
-from json import loads, dumps
+from flask import Flask, Response, abort, request
+from .package_data import PackagingSystem, PackagingConfig, LocationInformation, DateInformation
+import msgspec
+import orjson
 import pandas as pd
 from os.path import exists, dirname, abspath, join
 
@@ -14,29 +15,67 @@ log.setLevel(DEBUG)
 SIM_FILE = join(dirname(abspath(__file__)), "simulation.json")
 DEC_FILE = join(dirname(abspath(__file__)), "declarations.json")
 
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+QUOTE_FILENAME = 'attachment; filename="order_{}_quote.xlsx"'
+
 
 
 # could combine these into another function, leaving for now ...
 if not exists(SIM_FILE):
-    log.error(f"Failed to find: {SIM_FILE}")
+    log.error("Failed to find: %s", SIM_FILE)
     exit(1)
     
 if not exists(DEC_FILE):
-    log.error(f"Failed to find: {DEC_FILE}")
+    log.error("Failed to find: %s", DEC_FILE)
     exit(1)
-    
-with open(SIM_FILE) as json_file:
-    json_data = loads(json_file.read())
 
-with open(DEC_FILE) as json_file:
-    dec_data = loads(json_file.read())
-    
+
+def _load_json(filename, decode_type=None):
+    """Decode a json file, optionally to the msgspec type."""
+    with open(filename, "rb") as json_file:
+        if decode_type is None:
+            return msgspec.json.decode(json_file.read())
+        return msgspec.json.decode(json_file.read(), type=decode_type)
+
+
+json_data = _load_json(SIM_FILE)
+dec_data = _load_json(DEC_FILE, decode_type=PackagingConfig)
+
 psystem = PackagingSystem(json_data=dec_data)
 psystem._add_simulated_data(json_data=json_data)
 
 app = Flask("battery_pickup")
 
 
+def _request_json():
+    """Parse the body of the current request a single time. None is returned
+    when the request is not json. A json request with an empty or malformed 
+    body is rejected with a 400.
+    """
+    if not request.is_json:
+        return None
+
+    try:
+        return orjson.loads(request.get_data(cache=False))
+    except orjson.JSONDecodeError:
+        log.error("_request_json: failed to parse request json")
+        abort(400, description="ERROR: failed to parse request json")
+
+
+def _stream_orders(orders):
+    """Generate the {"orders": [...]} json response one order at a time
+    rather than encoding the entire response in memory. The orders are the 
+    simple_json dictionaries, created before the response is started so that 
+    any errors are raised before the headers are sent.
+    """
+    yield b'{"orders":['
+    for i, o in enumerate(orders):
+        if i:
+            yield b','
+        yield orjson.dumps(o)
+    yield b']}'
+
+
 @app.route('/info', methods=['GET', 'POST'])
 def handle_info_request():
     """Handle the info request to find information about orders and
@@ -58,9 +97,8 @@ def handle_info_request():
     pickup-location & date: Return all orders that match both.
     order-id: Return the specific order information.
     """
-    if request.is_json:
-        json = request.json
-            
+    json = _request_json()
+    if json is not None:
         # easy-case: only a single order will match (at most)
         if "order_id" in json: 
             # search for the order ID. If this does not exist return an error
@@ -73,9 +111,7 @@ def handle_info_request():
                 log.debug("handle_info_request: day month year not provided correctly, skipping")
                 date_data.clear()
             else:
-                d = DateInformation()
-                d.from_dict(date_data)
-                args["date"] = d
+                args["date"] = DateInformation.from_dict_cls(date_data)
                 
             lookup_info = {
                 li: json.get(li, None) 
@@ -84,13 +120,12 @@ def handle_info_request():
             if None in list(lookup_info.values()):
                 log.error("handle_info_request: address information malformed")
                 return "ERROR: please provide: state, city, street_address, zip_code", 400
-            l = LocationInformation()
-            l.from_dict(lookup_info)
-            args["location"] = l
+            args["location"] = LocationInformation.from_dict_cls(lookup_info)
             
             orders = psystem.find_orders(**args)
 
-        return dumps({"orders": [o.simple_json for o in orders if o]}, indent=2)
+        orders = [o.simple_json for o in orders if o]
+        return Response(_stream_orders(orders), mimetype="application/json")
 
     return handle_info_request.__doc__, 400
     
@@ -104,36 +139,44 @@ def handle_quote_request():
     The following values are accepted:
     order_id
     accept: boolean
+
+    The quote is returned as an xlsx file with one row per package (Battery Type,
+    Weight, Quality, Assessed Value) followed by a Total row containing the total
+    Weight and Assessed Value, Bonus (%), Shipping and the Total paid.
     """
             
-    if request.is_json:
-        json = request.json
-        
+    json = _request_json()
+    if json is not None:
         if "order_id" in json and "accept" not in json: 
             # return a quote as a file to the user
             df = psystem.quote(json['order_id'])
             if df is None:
                 return f"failed to create quote for order {json['order_id']}", 400
 
-            #create an output stream
-            output = BytesIO()
-            writer = pd.ExcelWriter(output, engine='xlsxwriter')
+            order = psystem.orders[json['order_id']]
+            if order.xlsx_bytes is None:
+                #create an output stream
+                output = BytesIO()
+                writer = pd.ExcelWriter(
+                    output, engine='xlsxwriter', 
+                    engine_kwargs={'options': {'in_memory': True}}
+                )
+                    
+                df.to_excel(writer, startrow = 0, merge_cells = False, sheet_name = "Sheet_1")
+                workbook = writer.book
+                worksheet = writer.sheets["Sheet_1"]
+                format = workbook.add_format()
+                format.set_bg_color('#eeeeee')
+                worksheet.set_column(0,9,28)
                 
-            df.to_excel(writer, startrow = 0, merge_cells = False, sheet_name = "Sheet_1")
-            workbook = writer.book
-            worksheet = writer.sheets["Sheet_1"]
-            format = workbook.add_format()
-            format.set_bg_color('#eeeeee')
-            worksheet.set_column(0,9,28)
-            
-            writer.close()
-            output.seek(0)
+                writer.close()
+                # the quote does not change once created, save the file contents
+                order.xlsx_bytes = output.getvalue()
         
-            return send_file(
-                output, 
-                download_name=f"order_{json['order_id']}_quote.xlsx", 
-                as_attachment=True
-            )
+            resp = Response(order.xlsx_bytes, mimetype=XLSX_MIME)
+            resp.headers["Content-Disposition"] = QUOTE_FILENAME.format(json['order_id'])
+            resp.headers["Content-Length"] = str(len(order.xlsx_bytes))
+            return resp
 
         elif "order_id" in json and "accept" in json:
             answer = json["accept"]
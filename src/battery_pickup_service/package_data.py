@@ -1,7 +1,11 @@
 from logging import getLogger, DEBUG
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 from datetime import datetime
+import numpy as np
+from operator import attrgetter
+from typing import Dict, List
+import msgspec
+from numba import njit
 import pandas as pd
 
 
@@ -11,10 +15,28 @@ log.setLevel(DEBUG)
 
 class BaseData:
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # fetch every slot as a tuple in a single (C level) call. attrgetter
+        # returns the bare value for a single slot, so wrap it in a tuple.
+        getter = attrgetter(*cls.__slots__)
+        if len(cls.__slots__) == 1:
+            cls._key = staticmethod(lambda o: (getter(o),))
+        else:
+            cls._key = staticmethod(getter)
+        cls._slot_set = frozenset(cls.__slots__)
+
     def from_dict(self, data):
-        for k, v in data.items():
-            if k in self.__slots__:
-                setattr(self, k, v)
+        for k in self._slot_set & data.keys():
+            setattr(self, k, data[k])
+
+    @classmethod
+    def from_dict_cls(cls, data):
+        """Create a new instance from a dictionary without calling __init__."""
+        o = cls.__new__(cls)
+        for k in cls._slot_set & data.keys():
+            object.__setattr__(o, k, data[k])
+        return o
 
     @property
     def json(self):
@@ -23,45 +45,48 @@ class BaseData:
         }
 
     def __eq__(self, other):
-        for slot in self.__slots__:
-            if getattr(self, slot, None) is None or \
-                getattr(other, slot, None) is None or \
-                getattr(self, slot) != getattr(other, slot):
-                return False
-        return True
+        if type(self) is not type(other):
+            return False
+        try:
+            key = self._key(self)
+            # unset (None) values never match
+            return None not in key and key == self._key(other)
+        except AttributeError:
+            # at least one of the slots was never set
+            return False
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
 
 class LocationInformation(BaseData):
-    __slots__ = [
+    __slots__ = (
         "state",
         "city",
         "street_address",
         "zip_code"
-    ]
+    )
 
 class DateInformation(BaseData):
     # Could use a DateTime object
-    __slots__ = ['day', 'month', 'year']
+    __slots__ = ('day', 'month', 'year')
 
     def __ge__(self, other):
         return datetime(self.year, self.month, self.day) >= datetime(other.year, other.month, other.day)
 
 class BatteryPackage(BaseData):
 
-    __slots__ = [
+    __slots__ = (
         "battery_type",
         "battery_weight",
         "quality", # int 0 - 100%
         "return_reason",
-    ]
+    )
 
 
 class Order:
     
-    def __init__(self, order_id=None, location=None, date=None, packages=[]):
+    def __init__(self, order_id=None, location=None, date=None, packages=None):
         self.order_id = order_id
         self.distance_to_ship = 0.0
 
@@ -73,17 +98,20 @@ class Order:
         if isinstance(date, DateInformation):
             self.date = date
 
-        self.packages = []
-        for package in packages:
-            if isinstance(package, BatteryPackage):
-                self.packages.append(package)
+        # never share a default list between orders
+        packages = packages or ()
+        self.packages = [p for p in packages if isinstance(p, BatteryPackage)]
 
         # quote is associated with an order. Only a single valid quote
         # can be associated with an order. 
         self.total_cost = None
         self.accepted = False
         self.df = None
-        
+        # serialized xlsx version of the quote (df)
+        self.xlsx_bytes = None
+
+        # static portion of simple_json, created on first access
+        self._simple_json_cache = None        
     
     def from_dict(self, data):
         if "order_id" in data:
@@ -93,20 +121,24 @@ class Order:
             self.distance_to_ship = data["distance"]
 
         if "location" in data:
-            l = LocationInformation()
-            l.from_dict(data["location"])
-            self.location = l
+            self.location = LocationInformation.from_dict_cls(data["location"])
 
         if "date" in data:
-            d = DateInformation()
-            d.from_dict(data["date"])
-            self.date = d
+            self.date = DateInformation.from_dict_cls(data["date"])
         
         if "packages" in data:
-            for package in data["packages"]:
-                p = BatteryPackage()
-                p.from_dict(package)
-                self.packages.append(p)
+            self.packages.extend(
+                BatteryPackage.from_dict_cls(package) for package in data["packages"]
+            )
+
+        self._simple_json_cache = None
+
+    @classmethod
+    def from_dict_cls(cls, data):
+        """Create a new order from a dictionary."""
+        o = cls()
+        o.from_dict(data)
+        return o
     
     @property
     def json(self):
@@ -121,38 +153,124 @@ class Order:
 
     @property
     def simple_json(self):
-        return {
-            "order_id": self.order_id,
-            "date": self.date.json,
-            "location": self.location.json,
-            "accepted": self.accepted
-        }
+        # only the accepted value can change after the order is created
+        if self._simple_json_cache is None:
+            self._simple_json_cache = {
+                "order_id": self.order_id,
+                "date": self.date.json,
+                "location": self.location.json,
+            }
+        return {**self._simple_json_cache, "accepted": self.accepted}
+
+
+class QualityBand(msgspec.Struct):
+    max_percent: float
+    multiplier: float
+    description: str = ""
+
+
+class DistanceBand(msgspec.Struct):
+    min_distance: float
+    multiplier: float
+    description: str = ""
+
 
+class WeightBand(msgspec.Struct):
+    max_weight: float
+    multiplier: float
 
-def _simple_compare(x, y, var):
-    if x == getattr(y, var):
-        return y
-    return None
 
-def _find_inner_data(func, compare_var, list_vars, var):
-    """Internal function to parallelize comparisons between types.
-    This is a semi-generic function used for  the posibility of a large list
-    of data.
+class BonusBand(msgspec.Struct):
+    min_packages: int
+    percent: float
+
+
+class PackagingConfig(msgspec.Struct):
+    """Typed version of the json configuration that controls the PackagingSystem."""
+    qualities: List[QualityBand]
+    package_types: Dict[str, float]
+    battery_packaging: Dict[str, str]
+    weights: List[WeightBand]
+    battery_base_value: Dict[str, float]
+    distance: List[DistanceBand]
+    bonus: List[BonusBand]
+
+
+def _band_table(bands, threshold, value, default, at_least, first_match=False):
+    """Precompute a lookup table for a list of bands (distance, qualities, ...) so
+    that the matching band can be found with a bisect rather than a linear scan.
+
+    The bands are evaluated in configuration order and either the first or the last
+    matching band wins. The table preserves that behavior for any configuration order.
+
+    :param bands: list of bands (QualityBand, DistanceBand, ...) from the configuration
+    :param threshold: name of the band threshold attribute
+    :param value: name of the attribute to return for a matching band
+    :param default: value returned when no band matches
+    :param at_least: when True a band matches when x >= threshold (use bisect_right),
+    otherwise a band matches when x <= threshold (use bisect_left)
+    :param first_match: when True the first matching band wins, otherwise the last
+
+    :return: (thresholds, values) where values[bisect(thresholds, x)] is the result
     """
-    matching_results = []
+    ordered = sorted(range(len(bands)), key=lambda i: getattr(bands[i], threshold))
+    thresholds = [getattr(bands[i], threshold) for i in ordered]
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {
-            executor.submit(func, compare_var, list_vars[i], var): 
-            i for i in range(len(list_vars))
-        }
+    # the matching bands are always a prefix (at_least) or suffix of the sorted
+    # bands, find the winning band for each prefix/suffix
+    pick = min if first_match else max
+    values = [default]
+    winner = None
+    for i in (ordered if at_least else reversed(ordered)):
+        winner = i if winner is None else pick(winner, i)
+        values.append(getattr(bands[winner], value))
+
+    if not at_least:
+        values.reverse()
+
+    return thresholds, values
+
+
+@njit(cache=True)
+def _compute_quote(qualities, weights, type_ids, base_values, q_thresh, q_mult, w_thresh, w_mult,
+                   d_thresh, d_mult, b_thresh, b_pct, distance):
+    """Numerical core of PackagingSystem.quote. The band tables are the arrays created
+    by _band_table, base_values is indexed by the battery type ids.
+
+    :return: (values, assessed_value, total_weight, base_shipping, bonus, total_to_pay)
+    where total_to_pay has not been rounded or limited to the minimum value yet.
+    """
+    n = qualities.shape[0]
+
+    # quality <= max_percent -> bisect_left -> searchsorted side="left"
+    q_idx = np.searchsorted(q_thresh, qualities, side="left")
+
+    values = np.empty(n)
+    assessed_value = 0.0
+    total_weight = 0.0
+    for i in range(n):
+        values[i] = base_values[type_ids[i]] * q_mult[q_idx[i]]
+        assessed_value += values[i]
+        total_weight += weights[i]
+
+    base_shipping = distance * d_mult[np.searchsorted(d_thresh, distance, side="right")]
+    weight_mult = w_mult[np.searchsorted(w_thresh, total_weight, side="left")]
+    bonus = b_pct[np.searchsorted(b_thresh, float(n), side="right")]
+
+    total_to_pay = assessed_value - (base_shipping * weight_mult)
+    total_to_pay = total_to_pay + (total_to_pay * (bonus / 100.00))
+
+    return values, assessed_value, total_weight, base_shipping, bonus, total_to_pay
 
-        for futr in as_completed(futures):
-            if futr.result() is not None:
-                matching_results.append(futr.result())
-    
-    return matching_results
 
+def _loc_key(location):
+    """Hashable key used to index orders by their pickup location."""
+    return (
+        getattr(location, "state", None),
+        getattr(location, "city", None),
+        getattr(location, "street_address", None),
+        getattr(location, "zip_code", None),
+    )
 
 
 class PackagingSystem:
@@ -170,45 +288,123 @@ class PackagingSystem:
     ]
 
     def __init__(self, json_data={}):
-        
+        """
+        :param json_data: PackagingConfig or the dictionary that it is created from
+        """
+        if not isinstance(json_data, PackagingConfig):
+            for key in PackagingSystem._required_data:
+                if key not in json_data:
+                    raise KeyError(f"failed to find {key} in json configuration")
+            json_data = msgspec.convert(json_data, PackagingConfig)
+
         for key in PackagingSystem._required_data:
-            if key not in json_data:
-                raise KeyError(f"failed to find {key} in json configuration")
-            setattr(self, key, json_data[key])
+            setattr(self, key, getattr(json_data, key))
     
+        # lookup tables for the bands used when creating a quote, these are
+        # passed to _compute_quote so store them as arrays
+        self._d_thresh, self._d_mult = (
+            np.asarray(x, dtype=np.float64) for x in _band_table(
+                self.distance, "min_distance", "multiplier", 1, at_least=True
+            )
+        )
+        self._q_thresh, self._q_mult = (
+            np.asarray(x, dtype=np.float64) for x in _band_table(
+                self.qualities, "max_percent", "multiplier", 0, at_least=False
+            )
+        )
+        self._w_thresh, self._w_mult = (
+            np.asarray(x, dtype=np.float64) for x in _band_table(
+                self.weights, "max_weight", "multiplier", 1.0, at_least=False, first_match=True
+            )
+        )
+        self._b_thresh, self._b_pct = (
+            np.asarray(x, dtype=np.float64) for x in _band_table(
+                self.bonus, "min_packages", "percent", 0.0, at_least=True
+            )
+        )
+
+        # battery types are assigned an integer id so that the base values
+        # can be looked up by array index
+        types = sorted(self.battery_base_value)
+        self._type_id = {t: i for i, t in enumerate(types)}
+        self._base_val_arr = np.array(
+            [self.battery_base_value[t] for t in types], dtype=np.float64
+        )
+
+        # compile _compute_quote now (with the same argument types quote uses)
+        # rather than during the first quote request
+        self._compute_quote(
+            np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.intp), 0.0
+        )
+
         self._order_lock = Lock()
 
         # dictionary of orders where the key is the order_id and the 
         # values are the order objects
         self.orders = {}
 
+        # secondary index of orders where the key is the location key
+        # (see _loc_key) and the values are lists of order objects
+        self._by_location = {}
+
+    def _compute_quote(self, qualities, weights, type_ids, distance):
+        """Call _compute_quote with the base values and band tables of this system."""
+        return _compute_quote(
+            qualities, weights, type_ids, self._base_val_arr,
+            self._q_thresh, self._q_mult, self._w_thresh, self._w_mult,
+            self._d_thresh, self._d_mult, self._b_thresh, self._b_pct,
+            distance
+        )
+
     def _add_simulated_data(self, json_data):
         """INTERNAL ONLY
 
         Add simulated data read in from a json file. This will fill the 
         Packaging system with data used for testing purposes only.
         """
-        log.warn("PackagingSystem._add_simulated_data: invoking simulated data")
-        if "orders" in json_data:
-            for order in json_data["orders"]:
-                o = Order()
-                o.from_dict(order)
-
-                if o.order_id is not None:
-                    self.orders[o.order_id] = o
-                else:
-                    log.warn("PackagingSystem._add_simulated_data: order found without an id")
+        log.warning("PackagingSystem._add_simulated_data: invoking simulated data")
+        orders = [Order.from_dict_cls(order) for order in json_data.get("orders", [])]
+        new_orders = {o.order_id: o for o in orders if o.order_id is not None}
+        for o in new_orders.values():
+            # simulated data replaces an existing order with the same id
+            existing = self.orders.get(o.order_id, None)
+            if existing is not None:
+                self._unindex_order(existing)
+            self._index_order(o)
+        self.orders.update(new_orders)
+
+        skipped = sum(1 for o in orders if o.order_id is None)
+        if skipped:
+            log.warning("PackagingSystem._add_simulated_data: %d orders found without an id", skipped)
 
 
     def add_order(self, order):
-        # If the order does not exist, add the order to the dictionary
-        if order.order_id in self.orders:
-            log.warn(f"PackagingSystem.add_order: {order.order_id} already exists, skipping")
+        # If the order does not exist, add the order to the dictionary. setdefault
+        # is atomic so concurrent writers cannot replace an existing order.
+        if self.orders.setdefault(order.order_id, order) is not order:
+            log.warning("PackagingSystem.add_order: %s already exists, skipping", order.order_id)
             return
         
-        log.debug(f"PackagingSystem.add_order: adding {order.order_id}")
-        self.orders[order.order_id] = order
-        
+        log.debug("PackagingSystem.add_order: adding %s", order.order_id)
+        self._index_order(order)
+
+    def _index_order(self, order):
+        """Add the order to the location index."""
+        if order.location is not None:
+            self._by_location.setdefault(_loc_key(order.location), []).append(order)
+
+    def _unindex_order(self, order):
+        """Remove the order from the location index."""
+        if order.location is None:
+            return
+        key = _loc_key(order.location)
+        orders = self._by_location.get(key, [])
+        if order in orders:
+            orders.remove(order)
+        if not orders:
+            self._by_location.pop(key, None)
+
     def find_orders(self, order_id=None, location=None, date=None):
         """Find a list of orders that match the criteria. If the order_id is provided,
         at most one order will be returned in the list. If only the location is provided, then
@@ -229,115 +425,84 @@ class PackagingSystem:
             log.error("PackagingSystem.find_orders: a valid order id or location is required")
             return None
         
-        matching_results = []
+        # locations with missing fields never match any order
+        key = _loc_key(location)
+        if None in key:
+            return []
 
-        # this could potentially get large due too a high number of orders,
-        # let's parallelize this a bit 
-        with self._order_lock:
-            orders = list(self.orders.values())
-
-        # filter out all data where the location does not match
-        matching_results = _find_inner_data(_simple_compare, location, orders, "location")
-        if matching_results and date is not None:
-            # filter out the data where the date does not match
-            matching_results = _find_inner_data(_simple_compare, date, matching_results, "date")
+        # copying the list is atomic under the GIL, no lock is needed
+        orders = list(self._by_location.get(key, ()))
 
-        return matching_results
+        if date is None:
+            return orders
+        return [o for o in orders if o.date == date]
     
     def quote_reply(self, order_id, answer):
-        with self._order_lock:
-            if order_id in self.orders:
-                self.orders[order_id].accepted = answer
+        order = self.orders.get(order_id, None)
+        if order is not None:
+            order.accepted = answer
     
     def quote(self, order_id):
         """
         total = (Base for each type * quality) - shipping costs
 
         Minimum value is $100 total
-        """
-        with self._order_lock:
-            order = self.orders.get(order_id, None)
 
+        :return: DataFrame with one row per package (Battery Type, Weight, Quality,
+        Assessed Value) followed by a "Total" row with the Weight, Assessed Value,
+        Bonus (%), Shipping and Total. None when the order does not exist.
+        """
+        order = self.orders.get(order_id, None)
         if not order:
             return None
         
-        if order.total_cost is not None:
-            return order.total_cost
-
-        battery_types = []  # append empty string at the end later
-        battery_weights = []
-        battery_values = []  # last value will be the total
-        battery_qualities = []
-
-        # calculate shipping costs
-        distance = order.distance_to_ship
-        distance_mult = 1
-        for d in self.distance:
-            if distance >= d["min_distance"]:
-                distance_mult = d["multiplier"]
-
-        base_shipping = distance * distance_mult
-
-        total_weight = 0.0
-        total_to_pay = 0.0
-        for package in order.packages:
-            quality_mult = 0
-            for quality in self.qualities:
-                if package.quality <= quality["max_percent"]:
-                    quality_mult = quality["multiplier"]
-            
-            total_to_pay = total_to_pay + (
-                self.battery_base_value[package.battery_type] * quality_mult
-            )
-            total_weight = total_weight + package.battery_weight
+        # the quote only needs to be created once per order
+        if order.df is not None:
+            return order.df
 
-            # dataframe data
-            battery_types.append(package.battery_type)
-            battery_weights.append(package.battery_weight)
-            battery_values.append(self.battery_base_value[package.battery_type] * quality_mult)
-            battery_qualities.append(package.quality)
-        
-        weight_mult = 1.0
-        for w in self.weights:
-            if total_weight <= w["max_weight"]:
-                weight_mult = w["multiplier"]
-                break
-
-        total_to_pay = total_to_pay - (base_shipping * weight_mult)
-
-        bonus = 0.0
-        for b in self.bonus:
-            if len(order.packages) >= b["min_packages"]:
-                bonus = b["percent"]
-        
-        total_to_pay = total_to_pay + (total_to_pay * (bonus / 100.00))
+        num_packages = len(order.packages)
+        qualities = np.fromiter(
+            (p.quality for p in order.packages), dtype=np.float64, count=num_packages
+        )
+        weights = np.fromiter(
+            (p.battery_weight for p in order.packages), dtype=np.float64, count=num_packages
+        )
+        type_ids = np.fromiter(
+            (self._type_id[p.battery_type] for p in order.packages),
+            dtype=np.intp, count=num_packages
+        )
+
+        values, assessed_value, total_weight, base_shipping, bonus, total_to_pay = (
+            self._compute_quote(
+                qualities, weights, type_ids, float(order.distance_to_ship)
+            )
+        )
         total_to_pay = round(max([total_to_pay, 100.00]), 2)
 
-        # correct dataframe data
-        bonus_data = [""] * len(battery_types) 
-        bonus_data.append(f"{bonus}%")
-        shipping_data = [""] * len(battery_types) 
-        shipping_data.append(base_shipping)
-        totals = [""] * len(battery_types)
-        totals.append(total_to_pay)
-
-        battery_types.append("")
-        battery_weights.append(sum(battery_weights))
-        battery_qualities.append("")
-        battery_values.append(sum(battery_values))
-
-        df = pd.DataFrame(
-            [
-                battery_types, battery_weights, battery_qualities, 
-                battery_values, bonus_data, shipping_data, totals
-            ],
-            index=[
-                "Battery Type", "Weight", "Quality", "Assessed Value", "Bonus", "Shipping", "Total"
-            ]
+        # one row per package, numeric columns stay float64
+        df = pd.DataFrame({
+            "Battery Type": [p.battery_type for p in order.packages],
+            "Weight": weights,
+            "Quality": qualities,
+            "Assessed Value": values,
+        })
+
+        # summary row, columns that do not apply are left empty (NaN)
+        summary = pd.DataFrame(
+            {
+                "Weight": [total_weight],
+                "Assessed Value": [assessed_value],
+                "Bonus (%)": [bonus],
+                "Shipping": [base_shipping],
+                "Total": [total_to_pay],
+            },
+            index=["Total"]
         )
+        df = pd.concat([df, summary])
 
+        # creating the quote is idempotent, the lock only prevents a torn write
         with self._order_lock:
-            self.orders[order_id].total_cost = total_to_pay
-            self.orders[order_id].df = df
+            order.total_cost = total_to_pay
+            order.df = df
 
         return df
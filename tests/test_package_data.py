@@ -0,0 +1,194 @@
+from battery_pickup_service.package_data import (
+    PackagingSystem, LocationInformation, _band_table,
+    QualityBand, DistanceBand, WeightBand, BonusBand
+)
+from bisect import bisect_left, bisect_right
+from json import loads
+from os.path import abspath, dirname, join
+import pytest
+import random
+
+DATA_DIR = join(dirname(dirname(abspath(__file__))), "src", "battery_pickup_service")
+
+
+@pytest.fixture
+def psystem():
+    with open(join(DATA_DIR, "declarations.json")) as json_file:
+        psystem = PackagingSystem(json_data=loads(json_file.read()))
+    with open(join(DATA_DIR, "simulation.json")) as json_file:
+        psystem._add_simulated_data(json_data=loads(json_file.read()))
+    return psystem
+
+
+def test_simulated_data_replaces_indexed_order(psystem):
+    location = {
+        "state": "Ohio",
+        "city": "Columbus",
+        "street_address": "1 Test Road",
+        "zip_code": "43004"
+    }
+    order = {
+        "order_id": 99,
+        "distance": 10.0,
+        "location": location,
+        "date": {"day": 1, "month": 1, "year": 2024},
+        "packages": []
+    }
+    psystem._add_simulated_data(json_data={"orders": [order]})
+    psystem._add_simulated_data(json_data={"orders": [order]})
+
+    orders = psystem.find_orders(location=LocationInformation.from_dict_cls(location))
+    assert len(orders) == 1
+    assert orders[0] is psystem.orders[99]
+
+
+def test_quote_twice_returns_same_dataframe(psystem):
+    df = psystem.quote(4)
+    assert df is not None
+    assert psystem.quote(4) is df
+    assert psystem.orders[4].total_cost is not None
+
+
+def test_quote_layout(psystem):
+    df = psystem.quote(4)
+    assert list(df.columns) == [
+        "Battery Type", "Weight", "Quality", "Assessed Value", "Bonus (%)", "Shipping", "Total"
+    ]
+    # one row per package followed by the summary row
+    assert list(df.index) == [0, 1, 2, 3, 4, 5, "Total"]
+    assert list(df["Battery Type"].iloc[:6]) == [
+        "NiCd", "Alkaline", "Alkaline", "Lithium Ion", "Lithium Ion", "NiMH"
+    ]
+    assert df.iloc[:6][["Bonus (%)", "Shipping", "Total"]].isna().all().all()
+
+    total = df.loc["Total"]
+    assert total["Weight"] == pytest.approx(60.2)
+    assert total["Assessed Value"] == pytest.approx(df["Assessed Value"].iloc[:6].sum())
+    assert total["Bonus (%)"] == 5.0
+    assert total["Shipping"] == pytest.approx(6.701)
+    assert total["Total"] == psystem.orders[4].total_cost
+    assert df.loc["Total", ["Battery Type", "Quality"]].isna().all()
+
+    for column in ["Weight", "Quality", "Assessed Value", "Bonus (%)", "Shipping", "Total"]:
+        assert df[column].dtype == "float64"
+
+
+def test_quote_invalid_order_id(psystem):
+    assert psystem.quote(5) is None
+
+
+# The linear scans that quote() used before the band tables. The tables must
+# return the same value as these for any band order.
+def _scan_distance(bands, distance):
+    mult = 1
+    for d in bands:
+        if distance >= d.min_distance:
+            mult = d.multiplier
+    return mult
+
+
+def _scan_quality(bands, quality):
+    mult = 0
+    for q in bands:
+        if quality <= q.max_percent:
+            mult = q.multiplier
+    return mult
+
+
+def _scan_weight(bands, weight):
+    mult = 1.0
+    for w in bands:
+        if weight <= w.max_weight:
+            mult = w.multiplier
+            break
+    return mult
+
+
+def _scan_bonus(bands, num_packages):
+    bonus = 0.0
+    for b in bands:
+        if num_packages >= b.min_packages:
+            bonus = b.percent
+    return bonus
+
+
+def _table_distance(bands, distance):
+    thresh, mult = _band_table(bands, "min_distance", "multiplier", 1, at_least=True)
+    return mult[bisect_right(thresh, distance)]
+
+
+def _table_quality(bands, quality):
+    thresh, mult = _band_table(bands, "max_percent", "multiplier", 0, at_least=False)
+    return mult[bisect_left(thresh, quality)]
+
+
+def _table_weight(bands, weight):
+    thresh, mult = _band_table(
+        bands, "max_weight", "multiplier", 1.0, at_least=False, first_match=True
+    )
+    return mult[bisect_left(thresh, weight)]
+
+
+def _table_bonus(bands, num_packages):
+    thresh, pct = _band_table(bands, "min_packages", "percent", 0.0, at_least=True)
+    return pct[bisect_right(thresh, num_packages)]
+
+
+def test_band_table_unsorted_bands():
+    distance = [DistanceBand(500, 0.01), DistanceBand(0, 0.04), DistanceBand(100, 0.02)]
+    quality = [QualityBand(75.0, 1.0), QualityBand(25.0, 0.3), QualityBand(100.0, 1.5)]
+    weight = [WeightBand(55, 2.5), WeightBand(10, 1.0), WeightBand(20, 1.5)]
+    bonus = [BonusBand(15, 20.0), BonusBand(5, 5.0), BonusBand(10, 10.0)]
+
+    for x in [0, 5, 10, 15, 20, 25, 50, 55, 75, 99, 100, 250, 500, 1000]:
+        assert _table_distance(distance, x) == _scan_distance(distance, x)
+        assert _table_quality(quality, x) == _scan_quality(quality, x)
+        assert _table_weight(weight, x) == _scan_weight(weight, x)
+        assert _table_bonus(bonus, x) == _scan_bonus(bonus, x)
+
+
+def test_band_table_ties():
+    # equal thresholds, the configuration order decides which band wins
+    distance = [DistanceBand(100, 0.02), DistanceBand(0, 0.04), DistanceBand(100, 0.03)]
+    quality = [QualityBand(50.0, 0.75), QualityBand(50.0, 0.5), QualityBand(25.0, 0.3)]
+    weight = [WeightBand(20, 1.5), WeightBand(10, 1.0), WeightBand(20, 2.0)]
+    bonus = [BonusBand(5, 5.0), BonusBand(5, 7.0)]
+
+    for x in [0, 5, 10, 20, 25, 50, 100, 150]:
+        assert _table_distance(distance, x) == _scan_distance(distance, x)
+        assert _table_quality(quality, x) == _scan_quality(quality, x)
+        assert _table_weight(weight, x) == _scan_weight(weight, x)
+        assert _table_bonus(bonus, x) == _scan_bonus(bonus, x)
+
+    assert _table_distance(distance, 100) == 0.03
+    assert _table_quality(quality, 10) == 0.3
+    assert _table_weight(weight, 15) == 1.5
+
+
+def test_band_table_no_match():
+    # the defaults are returned when no band matches (including no bands)
+    assert _table_distance([DistanceBand(100, 0.02)], 50) == 1
+    assert _table_quality([QualityBand(50.0, 0.75)], 75) == 0
+    assert _table_weight([WeightBand(10, 1.0)], 20) == 1.0
+    assert _table_bonus([BonusBand(5, 5.0)], 2) == 0.0
+
+    assert _table_distance([], 50) == 1
+    assert _table_quality([], 75) == 0
+    assert _table_weight([], 20) == 1.0
+    assert _table_bonus([], 2) == 0.0
+
+
+def test_band_table_random():
+    rng = random.Random(0)
+    for _ in range(500):
+        n = rng.randint(0, 6)
+        distance = [DistanceBand(rng.randint(0, 10), rng.random()) for _ in range(n)]
+        quality = [QualityBand(rng.randint(0, 10), rng.random()) for _ in range(n)]
+        weight = [WeightBand(rng.randint(0, 10), rng.random()) for _ in range(n)]
+        bonus = [BonusBand(rng.randint(0, 10), rng.random()) for _ in range(n)]
+        x = rng.randint(-1, 11)
+
+        assert _table_distance(distance, x) == _scan_distance(distance, x)
+        assert _table_quality(quality, x) == _scan_quality(quality, x)
+        assert _table_weight(weight, x) == _scan_weight(weight, x)
+        assert _table_bonus(bonus, x) == _scan_bonus(bonus, x)